@@ -0,0 +1,104 @@
+import os
+from cli import create_parser, dry_run
+from defaults import MAX_MW, TOLERANCE_MW
+from profiling import stage
+
+# Define data directory
+data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def parse_args():
+    parser = create_parser("Hosting capacity and short-circuit power of the filtered substations.")
+    parser.add_argument("--max-mw", type=float, default=MAX_MW, help="upper bound of the bisection search")
+    parser.add_argument("--tolerance-mw", type=float, default=TOLERANCE_MW)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all CPUs)")
+    return parser.parse_args()
+
+
+def capacity_color(hosting_mw, max_mw):
+    if hosting_mw >= 0.5 * max_mw:
+        return "green"
+    elif hosting_mw >= 0.1 * max_mw:
+        return "orange"
+    return "red"
+
+
+def render_capacity_map(table, substations, max_mw):
+    import folium
+    import pandas as pd
+    from powergrid import marker_location
+
+    m = folium.Map(location=[54.1453, 13.6422], zoom_start=9)
+    layer = folium.FeatureGroup(name="Hosting capacity").add_to(m)
+    for rank, row in table.iterrows():
+        geometry = substations.geometry.loc[row.substation]
+        if geometry is None or geometry.is_empty:
+            continue
+        if pd.isna(row.hosting_mw):
+            # Not searched: slack bus or no bus in the network
+            radius, color, capacity = 4, "gray", row.limited_by
+        else:
+            radius = 4 + 8 * min(row.hosting_mw / max_mw, 1)
+            color = capacity_color(row.hosting_mw, max_mw)
+            capacity = f"{row.hosting_mw:.0f} MW ({row.limited_by})"
+        level = "n/a" if pd.isna(row.vn_kv) else f"{row.vn_kv:g} kV"
+        sk_mva = "n/a" if pd.isna(row.sk_mva) else f"{row.sk_mva:.0f} MVA"
+        folium.CircleMarker(
+            location=marker_location(geometry),
+            radius=radius,
+            color=color,
+            fill=True,
+            popup=f"#{rank} {row['name'] if isinstance(row['name'], str) else 'Unknown'}<br>"
+                  f"Level: {level}<br>Hosting capacity: {capacity}<br>"
+                  f"Short-circuit power: {sk_mva}"
+        ).add_to(layer)
+    folium.LayerControl().add_to(m)
+    return m
+
+
+def main():
+    args = parse_args()
+    if args.dry_run:
+        print(f"Would search up to {args.max_mw:g} MW per site (workers: {args.workers or 'all CPUs'})")
+        dry_run(["mecklenburg_power_lines.geojson", "mecklenburg_substations_filtered.geojson",
+                 "mecklenburg_transformers.geojson"],
+                ["hosting_capacity.csv", "hosting_capacity_map.html"])
+        return
+
+    import geopandas as gpd
+    from voltage_levels import build_multilevel_network
+    from hosting_capacity import study_sites
+
+    print("Loading power grid data...")
+    with stage("fetch", description="read geojson") as rec:
+        power_lines = gpd.read_file(os.path.join(data_dir, "mecklenburg_power_lines.geojson"))
+        substations = gpd.read_file(os.path.join(data_dir, "mecklenburg_substations_filtered.geojson"))
+        transformers = gpd.read_file(os.path.join(data_dir, "mecklenburg_transformers.geojson"))
+        rec["rows"] = len(power_lines) + len(substations) + len(transformers)
+
+    with stage("build net", substations=len(substations), lines=len(power_lines)) as build_rec:
+        net = build_multilevel_network(substations, power_lines, transformers)
+        build_rec.update(buses=len(net.bus), net_lines=len(net.line), trafos=len(net.trafo))
+    print(f"Base net: {len(net.bus)} buses, {len(net.line)} lines, {len(net.trafo)} transformers.")
+
+    print(f"Searching hosting capacity for {len(substations)} substations...")
+    with stage("hosting capacity", sites=len(substations)) as rec:
+        table = study_sites(net, substations, workers=args.workers,
+                            max_mw=args.max_mw, tolerance_mw=args.tolerance_mw)
+        rec["rows"] = len(table)
+    print(f"Evaluated {table.hosting_mw.notna().sum()} of {len(table)} sites ({(table.limited_by == 'slack').sum()} "
+          f"at a slack bus, {(table.limited_by == 'no bus').sum()} without a bus in the network).")
+    print("\nTop 10 sites:")
+    print(table.head(10).to_string())
+
+    with stage("save", rows=len(table)):
+        table.to_csv(os.path.join(data_dir, "hosting_capacity.csv"))
+
+    with stage("render", features=len(table)):
+        m = render_capacity_map(table, substations.to_crs("EPSG:4326"), args.max_mw)
+        m.save(os.path.join(data_dir, "hosting_capacity_map.html"))
+    print("✅ Results saved: 'hosting_capacity.csv' and 'hosting_capacity_map.html' in data directory")
+
+
+if __name__ == "__main__":
+    main()
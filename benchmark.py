@@ -0,0 +1,426 @@
+"""Offline benchmark of the pipeline stages on seeded synthetic data.
+
+    python benchmark.py                              # 1k and 10k, all stages
+    python benchmark.py --sizes 1k,10k,100k --stages filter,snap --budget 60
+    python benchmark.py --check                      # exit 1 on a regression
+    python benchmark.py --startup                    # interpreter startup and import times
+
+Every result is appended to data/benchmark_history.jsonl. With --check each
+result is compared to the best earlier run of the same stage and size, and a
+stage that is more than --threshold slower is reported as a regression.
+
+Every run of a stage gets --budget seconds. A run over budget is interrupted
+and recorded with status "timeout", and the stage is skipped at the larger
+sizes. Repeats that would not fit into the budget are left out.
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import signal
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pandapower as pp
+import shapely
+
+from powergrid import build_network, filter_substations, render_power_flow_map, run_power_flow, snap_lines
+from profiling import peak_rss_mb
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(repo_dir, 'data')
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+STAGES = ["filter", "snap", "build net", "runpp", "render", "render clustered"]
+BUDGET_S = 300
+
+# lon/lat bounding box of Landkreis Vorpommern-Greifswald
+REGION = (13.0, 53.4, 14.3, 54.3)
+VOLTAGES = ["110000", "110000", "220000", "380000", "380000;220000", "110000;20000", "20000"]
+
+SCRIPTS = [
+    "1_extract_osm_data.py",
+    "2_run_power_flow.py",
+    "3_visualize_power_flow.py",
+    "3_visualize_power_flow_110kv.py",
+    "3_visualize_power_flow_filtered.py",
+    "3_visualize_specific_line.py",
+    "4_hosting_capacity.py",
+]
+HEAVY_MODULES = ["osmnx", "geopandas", "pandapower", "folium", "shapely"]
+
+
+def random_points(rng, n):
+    x = rng.uniform(REGION[0], REGION[2], n)
+    y = rng.uniform(REGION[1], REGION[3], n)
+    return x, y
+
+
+def generate_substations(n, seed=0):
+    """Point substations named "Lubmin <i>" so that all of them become buses in build_network()."""
+    rng = np.random.default_rng(seed)
+    x, y = random_points(rng, n)
+    return gpd.GeoDataFrame({
+        "name": [f"Lubmin {i}" for i in range(n)],
+        "power": "substation",
+        "voltage": rng.choice(VOLTAGES, n),
+    }, geometry=shapely.points(x, y), crs="EPSG:4326")
+
+
+def generate_buildings(n, seed=1):
+    """Rectangular buildings of 8-40 m side length."""
+    rng = np.random.default_rng(seed)
+    x, y = random_points(rng, n)
+    # roughly 1e-5 degrees per metre at this latitude
+    w = rng.uniform(8, 40, n) * 1.5e-5
+    h = rng.uniform(8, 40, n) * 0.9e-5
+    return gpd.GeoDataFrame({"building": "yes"}, index=range(n),
+                            geometry=shapely.box(x, y, x + w, y + h), crs="EPSG:4326")
+
+
+def generate_parks(n, seed=2):
+    """Square nature reserves of 1-10 km side length."""
+    rng = np.random.default_rng(seed)
+    x, y = random_points(rng, n)
+    size = rng.uniform(0.015, 0.15, n)
+    return gpd.GeoDataFrame({"leisure": "nature_reserve"}, index=range(n),
+                            geometry=shapely.box(x, y, x + size, y + size * 0.6), crs="EPSG:4326")
+
+
+def generate_power_lines(n, seed=3, vertices=6):
+    """Power lines as random walks of a few kilometres."""
+    rng = np.random.default_rng(seed)
+    x, y = random_points(rng, n)
+    steps = rng.normal(0, 0.01, (n, vertices - 1, 2))
+    coords = np.concatenate([np.stack([x, y], axis=1)[:, None, :], steps], axis=1).cumsum(axis=1)
+    return gpd.GeoDataFrame({
+        "power": "line",
+        "voltage": rng.choice(VOLTAGES, n),
+    }, geometry=shapely.linestrings(coords), crs="EPSG:4326")
+
+
+def generate_net(n, seed=5, feeder_size=64):
+    """Radial 110 kV net of n buses for the power flow.
+
+    The buses form binary-tree feeders of feeder_size buses, each fed from one
+    slack bus over 1-10 km overhead lines. Load and generation per bus are a
+    few MW, so the power flow always converges.
+    """
+    rng = np.random.default_rng(seed)
+    net = pp.create_empty_network()
+    slack = pp.create_bus(net, vn_kv=110, name="slack")
+    pp.create_ext_grid(net, bus=slack, vm_pu=1.0, va_degree=0.0)
+    buses = np.asarray(pp.create_buses(net, n, vn_kv=110))
+
+    position = np.arange(n) % feeder_size
+    parent = np.arange(n) - position + (position - 1) // 2
+    from_buses = np.where(position == 0, slack, buses[np.maximum(parent, 0)])
+    pp.create_lines(net, from_buses, buses, length_km=rng.uniform(1, 10, n), std_type="149-AL1/24-ST1A 110.0")
+    pp.create_loads(net, buses, p_mw=rng.uniform(0.5, 2, n), q_mvar=rng.uniform(0.1, 0.5, n))
+    pp.create_sgens(net, buses, p_mw=rng.uniform(0, 3, n), q_mvar=0)
+    return net
+
+
+def generate_power_flow(n, seed=4):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"loading_percent": rng.uniform(0, 120, n)})
+
+
+class Scenario:
+    """Synthetic inputs for one size, generated lazily and shared by the stages.
+
+    ``n`` is the number of features of the largest layer of a stage. Substations
+    are n / 10 (filter: n / 100, as buildings outnumber them by far in OSM) and
+    parks n / 1000. The power flow runs on a radial net of n / 10 buses.
+    """
+
+    def __init__(self, n, seed=0):
+        self.n = n
+        self.seed = seed
+        self._cache = {}
+
+    def _get(self, key, factory):
+        if key not in self._cache:
+            self._cache[key] = factory()
+        return self._cache[key]
+
+    def substations(self, n):
+        return self._get(("substations", n), lambda: generate_substations(n, self.seed))
+
+    def buildings(self):
+        return self._get("buildings", lambda: generate_buildings(self.n, self.seed + 1).to_crs("EPSG:3857"))
+
+    def parks(self):
+        return self._get("parks", lambda: generate_parks(max(self.n // 1000, 1), self.seed + 2).to_crs("EPSG:3857"))
+
+    def power_lines(self):
+        return self._get("power_lines", lambda: generate_power_lines(self.n, self.seed + 3))
+
+    def power_flow(self):
+        return self._get("power_flow", lambda: generate_power_flow(self.n, self.seed + 4))
+
+    def net(self):
+        return self._get("net", lambda: generate_net(max(self.n // 10, 2), self.seed + 5))
+
+    def stage_inputs(self, stage_name):
+        """Returns (callable, feature count) for a stage."""
+        if stage_name == "filter":
+            substations = self.substations(max(self.n // 100, 1)).to_crs("EPSG:3857")
+            buildings, parks = self.buildings(), self.parks()
+            return (lambda: filter_substations(substations, buildings, parks),
+                    len(substations) + len(buildings) + len(parks))
+        if stage_name == "snap":
+            substations, lines = self.substations(max(self.n // 10, 2)), self.power_lines()
+            bus_ids = list(range(len(substations)))
+            return lambda: list(snap_lines(lines, substations.geometry, bus_ids)), len(substations) + len(lines)
+        if stage_name == "build net":
+            substations, lines = self.substations(max(self.n // 10, 2)), self.power_lines()
+            return lambda: build_network(substations, lines), len(substations) + len(lines)
+        if stage_name == "runpp":
+            net = self.net()
+            return lambda: run_power_flow(net), len(net.bus) + len(net.line)
+        if stage_name in ("render", "render clustered"):
+            substations, lines = self.substations(max(self.n // 10, 2)), self.power_lines()
+            transformers, power_flow = substations.iloc[::2], self.power_flow()
+            cluster = stage_name == "render clustered"
+            return (lambda: render_power_flow_map(lines, substations, transformers, power_flow,
+                                                  cluster=cluster)[0].get_root().render(),
+                    len(lines) + len(substations) + len(transformers))
+        raise ValueError(f"Unknown stage: {stage_name}")
+
+
+class BudgetExceeded(BaseException):
+    """Raised in a stage that runs over its budget; a BaseException so the stage's own handlers let it pass."""
+
+
+@contextlib.contextmanager
+def time_limit(seconds):
+    """Interrupts the block after `seconds` with BudgetExceeded, where SIGALRM exists (not on Windows)."""
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def interrupt(signum, frame):
+        raise BudgetExceeded()
+
+    previous = signal.signal(signal.SIGALRM, interrupt)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def measure(fn, repeat=3, memory=True, budget=None):
+    """Runs fn `repeat` times and returns the fastest wall/CPU time, plus one traced run for memory.
+
+    With a budget in seconds a timed run that takes longer is interrupted and
+    the status is "timeout". Runs that would push the whole stage over the
+    budget are skipped, including the traced one; "runs" counts the timed runs.
+    """
+    result = {"wall_s": None, "cpu_s": None, "runs": 0, "status": "ok"}
+    start = time.perf_counter()
+
+    def fits(last_wall):
+        return not budget or time.perf_counter() - start + last_wall <= budget
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            wall = 0
+            for _ in range(repeat):
+                if not fits(wall):
+                    break
+                wall_start, cpu_start = time.perf_counter(), time.process_time()
+                with time_limit(budget):
+                    fn()
+                wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+                if budget and wall > budget:
+                    # Without SIGALRM the run is only checked afterwards
+                    raise BudgetExceeded()
+                result["runs"] += 1
+                if result["wall_s"] is None or wall < result["wall_s"]:
+                    result["wall_s"], result["cpu_s"] = round(wall, 4), round(cpu, 4)
+            if memory and fits(wall):
+                tracemalloc.start()
+                try:
+                    with time_limit(budget):
+                        fn()
+                    result["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+                except BudgetExceeded:
+                    # tracing slows the stage down, the timed runs above are what counts
+                    pass
+                finally:
+                    tracemalloc.stop()
+    except BudgetExceeded:
+        result["status"] = "timeout"
+        result["error"] = f"over the budget of {budget}s"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def time_command(command, repeat=3):
+    """Runs a command in a fresh interpreter `repeat` times and returns the fastest wall time."""
+    result = {"wall_s": None, "cpu_s": None, "status": "ok"}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(command, cwd=repo_dir, capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if proc.returncode != 0:
+            result["status"] = "error"
+            result["error"] = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+            return result
+        if result["wall_s"] is None or wall < result["wall_s"]:
+            result["wall_s"] = round(wall, 4)
+    return result
+
+
+def startup_benchmarks(repeat=3):
+    """Yields (stage, size, result) for the bare interpreter, every script's --help and --dry-run,
+    and the import of each heavy dependency."""
+    yield "startup", "python", time_command([sys.executable, "-c", "pass"], repeat)
+    for script in SCRIPTS:
+        for flag in ("--help", "--dry-run"):
+            yield "startup", f"{script} {flag}", time_command([sys.executable, script, flag], repeat)
+    for module in HEAVY_MODULES:
+        yield "import", module, time_command([sys.executable, "-c", f"import {module}"], repeat)
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path, records):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def find_regressions(history, records, threshold=0.25, min_delta=0.01):
+    """Returns (record, baseline) pairs where a record is slower than the best earlier run by more than threshold.
+
+    A stage that fails or times out now but succeeded before is a regression with the best earlier time as baseline.
+    """
+    regressions = []
+    for record in records:
+        earlier = [r["wall_s"] for r in history
+                   if r["stage"] == record["stage"] and r["size"] == record["size"] and r["status"] == "ok"]
+        if not earlier:
+            continue
+        baseline = min(earlier)
+        if record["status"] != "ok":
+            regressions.append((record, baseline))
+        elif record["wall_s"] > baseline * (1 + threshold) and record["wall_s"] - baseline > min_delta:
+            regressions.append((record, baseline))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data.")
+    parser.add_argument("--sizes", default="1k,10k", help=f"comma separated, any of {', '.join(SIZES)}")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma separated, any of {', '.join(STAGES)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--budget", type=float, default=BUDGET_S,
+                        help="seconds per run of a stage; a stage over budget is not run at larger sizes, 0 = no limit")
+    parser.add_argument("--startup", action="store_true",
+                        help="time interpreter startup, --help/--dry-run of every script and heavy imports instead")
+    parser.add_argument("--history", default=os.path.join(data_dir, "benchmark_history.jsonl"))
+    parser.add_argument("--check", action="store_true", help="exit with 1 if a stage regressed")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+
+    args.sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    args.stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    for size in args.sizes:
+        if size not in SIZES:
+            parser.error(f"unknown size {size!r}")
+    for stage_name in args.stages:
+        if stage_name not in STAGES:
+            parser.error(f"unknown stage {stage_name!r}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    history = load_history(args.history)
+    common = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+    }
+
+    records = []
+    if args.startup:
+        for stage_name, size, result in startup_benchmarks(args.repeat):
+            record = dict(common, stage=stage_name, size=size, **result)
+            records.append(record)
+            print(f"{stage_name:<8} {size:<45} {record['wall_s']}s  {record['status']}")
+            if record["status"] != "ok":
+                print(f"      {record['error']}")
+    else:
+        timed_out = {}
+        for size in args.sizes:
+            scenario = Scenario(SIZES[size], seed=args.seed)
+            for stage_name in args.stages:
+                if SIZES[size] >= timed_out.get(stage_name, math.inf):
+                    print(f"{size:>5} {stage_name:<10} skipped, over budget at a smaller size")
+                    continue
+                fn, features = scenario.stage_inputs(stage_name)
+                result = measure(fn, repeat=args.repeat, memory=not args.no_memory, budget=args.budget)
+                if result["status"] == "timeout":
+                    timed_out[stage_name] = SIZES[size]
+                record = dict(common, stage=stage_name, size=size, features=features, **result)
+                records.append(record)
+                print(f"{size:>5} {stage_name:<10} {features:>9} features  "
+                      f"wall {record['wall_s']}s  cpu {record['cpu_s']}s  "
+                      f"mem {record.get('tracemalloc_peak_mb')} MB  {record['status']}")
+                if record["status"] != "ok":
+                    print(f"      {record['error']}")
+
+    append_history(args.history, records)
+    print(f"Results appended to {args.history}")
+
+    if args.check:
+        regressions = find_regressions(history, records, args.threshold)
+        for record, baseline in regressions:
+            if record["status"] != "ok":
+                print(f"REGRESSION: {record['stage']} @ {record['size']}: {record['error']} (was ok, best {baseline}s)")
+            else:
+                print(f"REGRESSION: {record['stage']} @ {record['size']}: {record['wall_s']}s vs best {baseline}s")
+        if regressions:
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
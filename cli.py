@@ -0,0 +1,28 @@
+"""Argument parsing shared by the pipeline scripts.
+
+Only the standard library is imported here: --help and --dry-run must answer
+without loading osmnx, geopandas, pandapower or folium.
+"""
+import argparse
+import os
+
+data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def create_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--dry-run", action="store_true",
+                        help="list the input and output files and exit without running anything")
+    return parser
+
+
+def dry_run(inputs=(), outputs=()):
+    """Prints the files a script would read and write, relative to the data directory."""
+    for label, names in (("Reads", inputs), ("Writes", outputs)):
+        for name in names:
+            path = os.path.join(data_dir, name)
+            if os.path.exists(path):
+                status = f"{os.path.getsize(path) / 1024:.0f} kB"
+            else:
+                status = "missing"
+            print(f"{label:<7} {path} ({status})")
@@ -0,0 +1,12 @@
+"""Defaults of the study modules, readable without loading pandapower.
+
+voltage_levels and hosting_capacity use these as their defaults; the scripts
+use them for their command line options.
+"""
+
+# How the other voltage levels are represented when solving one level (voltage_levels.solve_levels)
+REDUCTIONS = ("injections", "ward", "xward", "rei")
+
+# Hosting capacity search (hosting_capacity.hosting_capacity)
+MAX_MW = 500  # upper bound of the search
+TOLERANCE_MW = 1
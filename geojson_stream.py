@@ -0,0 +1,247 @@
+"""Streaming GeoJSON reader and writer for artifacts too large to hold in memory.
+
+Features are processed in fixed-size batches and each batch is reprojected on
+the fly, so memory stays flat regardless of the size of the file. The output
+has the same layout as GDAL's GeoJSON driver (one feature per line), so files
+written here can still be opened with ``gpd.read_file``.
+
+    python geojson_stream.py data/big.geojson data/big_wgs84.geojson --to-crs EPSG:4326
+"""
+import argparse
+import json
+import os
+import re
+
+import geopandas as gpd
+from pandas.api.types import is_integer_dtype
+from pyproj import CRS
+
+BATCH_SIZE = 10_000
+CHUNK_SIZE = 1 << 20  # characters read per chunk
+
+FEATURES_RE = re.compile(r'"features"\s*:\s*\[')
+CRS_RE = re.compile(r'"crs"\s*:\s*\{\s*"type"\s*:\s*"name"\s*,\s*"properties"\s*:\s*\{\s*"name"\s*:\s*"([^"]+)"')
+WHITESPACE = " \t\r\n,"
+
+
+def crs_urn(crs):
+    """Returns the "crs" member name GDAL writes for a CRS."""
+    crs = CRS.from_user_input(crs)
+    epsg = crs.to_epsg()
+    if epsg == 4326:
+        return "urn:ogc:def:crs:OGC:1.3:CRS84"
+    if epsg is not None:
+        return f"urn:ogc:def:crs:EPSG::{epsg}"
+    return crs.to_string()
+
+
+def _json_default(value):
+    # numpy scalars and timestamps coming from GeoDataFrame columns
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _read_header(f, path, chunk_size):
+    """Reads up to the start of the features array. Returns (buffer, position after "[", crs)."""
+    buf = ""
+    match = None
+    while match is None:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            raise ValueError(f"{path} is not a GeoJSON FeatureCollection")
+        buf += chunk
+        match = FEATURES_RE.search(buf)
+
+    crs_match = CRS_RE.search(buf, 0, match.start())
+    return buf, match.end(), crs_match.group(1) if crs_match else "EPSG:4326"
+
+
+def read_crs(path, chunk_size=CHUNK_SIZE):
+    """Returns the CRS of a FeatureCollection without reading its features."""
+    with open(path, encoding="utf-8") as f:
+        return _read_header(f, path, chunk_size)[2]
+
+
+def iter_features(path, chunk_size=CHUNK_SIZE):
+    """Yields (crs, feature dict) for each feature of a FeatureCollection, reading the file in chunks.
+
+    The CRS is taken from the "crs" member before the features array and
+    defaults to EPSG:4326 (RFC 7946).
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf, pos, crs = _read_header(f, path, chunk_size)
+
+        while True:
+            # Skip separators, refilling the buffer when it runs out
+            while pos < len(buf) and buf[pos] in WHITESPACE:
+                pos += 1
+            if pos == len(buf):
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise ValueError(f"{path} ended inside the features array")
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            if buf[pos] == "]":
+                return
+
+            try:
+                feature, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Feature is cut off at the end of the buffer
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield crs, feature
+            pos = end
+            if pos > chunk_size:
+                buf, pos = buf[pos:], 0
+
+
+def read_batches(path, batch_size=BATCH_SIZE, to_crs=None, chunk_size=CHUNK_SIZE):
+    """Yields GeoDataFrames of at most batch_size features, reprojected to to_crs if given."""
+    batch, crs = [], None
+    for crs, feature in iter_features(path, chunk_size):
+        batch.append(feature)
+        if len(batch) == batch_size:
+            yield _to_frame(batch, crs, to_crs)
+            batch = []
+    if batch:
+        yield _to_frame(batch, crs, to_crs)
+
+
+def _to_frame(features, crs, to_crs):
+    gdf = gpd.GeoDataFrame.from_features(features, crs=crs)
+    if to_crs is not None:
+        gdf = gdf.to_crs(to_crs)
+    return gdf
+
+
+class GeoJSONWriter:
+    """Writes GeoDataFrame batches to one FeatureCollection as they arrive.
+
+    Like ``GeoDataFrame.to_file``, index=None writes the index as columns if it
+    is named or not integer (e.g. osmnx's ("element", "id")); True always
+    writes it, False never.
+
+    Features go to ``path + ".tmp"``, which replaces path only when the writer
+    is closed without an error; on an error it is deleted and path is left
+    untouched.
+
+    Usage:
+        with GeoJSONWriter(path, crs="EPSG:4326") as writer:
+            for batch in batches:
+                writer.write(batch)
+    """
+
+    def __init__(self, path, crs="EPSG:4326", name=None, index=None):
+        self.path = path
+        self.crs = crs
+        self.name = name or os.path.splitext(os.path.basename(path))[0]
+        self.index = index
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def tmp_path(self):
+        return self.path + ".tmp"
+
+    def open(self):
+        header = f'{{\n"type": "FeatureCollection",\n"name": {json.dumps(self.name)},\n'
+        if self.crs is not None:
+            header += f'"crs": {{ "type": "name", "properties": {{ "name": "{crs_urn(self.crs)}" }} }},\n'
+        self._file = open(self.tmp_path, "w", encoding="utf-8", buffering=CHUNK_SIZE)
+        self._file.write(header + '"features": [\n')
+
+    def write(self, gdf):
+        """Reprojects one batch to the writer's CRS and appends its features."""
+        if self.crs is not None and gdf.crs is not None and not CRS.from_user_input(self.crs).equals(gdf.crs):
+            gdf = gdf.to_crs(self.crs)
+        index = self.index
+        if index is None:
+            index = list(gdf.index.names) != [None] or not is_integer_dtype(gdf.index.dtype)
+        if index:
+            gdf = gdf.reset_index()
+        for feature in gdf.iterfeatures(na="null", drop_id=True):
+            if self.count:
+                self._file.write(",\n")
+            self._file.write(json.dumps(feature, ensure_ascii=False, default=_json_default))
+            self.count += 1
+
+    def close(self):
+        """Finishes the collection and moves it to path."""
+        if self._file is None:
+            return
+        self._file.write("\n]\n}\n")
+        self._file.close()
+        self._file = None
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Drops the unfinished collection, path keeps its previous content."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self.tmp_path)
+
+
+def write_geojson(path, gdf, crs=None, batch_size=BATCH_SIZE, index=None):
+    """Writes a GeoDataFrame in batches, reprojecting one batch at a time. Returns the feature count.
+
+    crs defaults to the CRS of gdf; index is handled as in GeoJSONWriter.
+    """
+    with GeoJSONWriter(path, crs=crs if crs is not None else gdf.crs, index=index) as writer:
+        for start in range(0, len(gdf), batch_size):
+            writer.write(gdf.iloc[start:start + batch_size])
+    return writer.count
+
+
+def convert(src, dst, to_crs=None, batch_size=BATCH_SIZE):
+    """Streams src into dst batch by batch, optionally reprojecting. Returns the feature count.
+
+    dst may be src: it is only replaced once all features are written.
+    """
+    writer = None
+    try:
+        for batch in read_batches(src, batch_size, to_crs):
+            if writer is None:
+                writer = GeoJSONWriter(dst, crs=batch.crs)
+                writer.open()
+            writer.write(batch)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        writer.close()
+    else:
+        # Empty collection, still write a valid file
+        with GeoJSONWriter(dst, crs=to_crs if to_crs is not None else read_crs(src)) as writer:
+            pass
+    return writer.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a GeoJSON file into another, optionally reprojecting.")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--to-crs", default=None, help="target CRS, e.g. EPSG:4326")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    count = convert(args.src, args.dst, args.to_crs, args.batch_size)
+    print(f"Wrote {count} features to {args.dst}")
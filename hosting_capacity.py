@@ -0,0 +1,154 @@
+"""Hosting capacity and short-circuit power of candidate substations.
+
+For every site a bisection finds the largest sgen injection at the site's bus
+before a line or transformer loading or a bus voltage limit is violated. Only
+violations caused by the injection count: elements already above a limit in
+the base case may not get any worse. Sites are processed in parallel, each
+worker holding one copy of the shared base net.
+"""
+import copy
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pandapower as pp
+import pandapower.shortcircuit as sc
+
+from defaults import MAX_MW, TOLERANCE_MW
+
+MAX_LOADING_PERCENT = 100
+VM_MIN_PU, VM_MAX_PU = 0.9, 1.1
+
+# Short-circuit power of the external grids, per voltage level (kV, MVA)
+EXT_GRID_SC_MVA = [(300, 40000), (200, 20000), (60, 5000), (0, 500)]
+
+_net = None
+_limits = None
+
+
+def site_buses(net, substations):
+    """Maps every substation index to its highest-voltage bus; substations without a bus are left out."""
+    buses = net.bus[net.bus.substation.notna()]
+    highest = buses.sort_values("vn_kv", ascending=False).drop_duplicates("substation")
+    highest = highest[highest.substation.isin(substations.index)]
+    return pd.Series(highest.index, index=highest.substation.values)
+
+
+def short_circuit_power(net):
+    """Returns the maximum three-phase short-circuit power per bus in MVA (grid contribution only)."""
+    net = copy.deepcopy(net)
+    net.sgen["in_service"] = False
+    slack_kv = net.bus.vn_kv.loc[net.ext_grid.bus].values
+    net.ext_grid["s_sc_max_mva"] = [next(mva for min_kv, mva in EXT_GRID_SC_MVA if kv >= min_kv) for kv in slack_kv]
+    net.ext_grid["rx_max"] = 0.1
+    sc.calc_sc(net, case="max", ip=False, ith=False, branch_results=False)
+    return net.res_bus_sc.ikss_ka * net.bus.vn_kv.loc[net.res_bus_sc.index] * math.sqrt(3)
+
+
+def _init_worker(net, limits):
+    global _net, _limits
+    _net = net
+    _limits = limits
+    pp.runpp(_net, init="flat", calculate_voltage_angles=True)
+    _limits["line"] = np.maximum(_net.res_line.loading_percent.fillna(0).values, limits["max_loading"])
+    _limits["trafo"] = np.maximum(_net.res_trafo.loading_percent.fillna(0).values, limits["max_loading"])
+    _limits["vm_max"] = np.maximum(_net.res_bus.vm_pu.fillna(1).values, limits["vm_max_pu"])
+    _limits["vm_min"] = np.minimum(_net.res_bus.vm_pu.fillna(1).values, limits["vm_min_pu"])
+    _limits["supplied"] = set(_net.res_bus.index[_net.res_bus.vm_pu.notna()])
+
+
+def _violation(sgen):
+    """Runs the power flow and returns the first violated limit, or None."""
+    try:
+        pp.runpp(_net, init="results", calculate_voltage_angles=True)
+    except pp.LoadflowNotConverged:
+        # Start the next run from the base case again
+        _net.sgen.at[sgen, "p_mw"] = 0
+        pp.runpp(_net, init="flat", calculate_voltage_angles=True)
+        return "not converged"
+    if (_net.res_line.loading_percent.fillna(0).values > _limits["line"]).any():
+        return "line loading"
+    if (_net.res_trafo.loading_percent.fillna(0).values > _limits["trafo"]).any():
+        return "trafo loading"
+    vm = _net.res_bus.vm_pu.fillna(1).values
+    if (vm > _limits["vm_max"]).any() or (vm < _limits["vm_min"]).any():
+        return "voltage"
+    return None
+
+
+def _site_capacity(bus):
+    if bus not in _limits["supplied"]:
+        # Island without a slack, nothing can be fed in
+        return 0.0, "not supplied"
+    sgen = pp.create_sgen(_net, bus=bus, p_mw=_limits["max_mw"], q_mvar=0, name="hosting capacity")
+    try:
+        limit = _violation(sgen)
+        if limit is None:
+            return _limits["max_mw"], "max_mw"
+
+        low, high = 0.0, _limits["max_mw"]
+        while high - low > _limits["tolerance_mw"]:
+            mid = (low + high) / 2
+            _net.sgen.at[sgen, "p_mw"] = mid
+            violated = _violation(sgen)
+            if violated is None:
+                low = mid
+            else:
+                high, limit = mid, violated
+        return low, limit
+    finally:
+        _net.sgen.drop(sgen, inplace=True)
+        pp.runpp(_net, init="results", calculate_voltage_angles=True)
+
+
+def hosting_capacity(net, buses, max_mw=MAX_MW, tolerance_mw=TOLERANCE_MW, max_loading=MAX_LOADING_PERCENT,
+                     vm_min_pu=VM_MIN_PU, vm_max_pu=VM_MAX_PU, workers=None):
+    """Returns a DataFrame with hosting_mw and the limiting constraint for each bus in buses."""
+    limits = dict(max_mw=max_mw, tolerance_mw=tolerance_mw, max_loading=max_loading,
+                  vm_min_pu=vm_min_pu, vm_max_pu=vm_max_pu)
+    buses = list(buses)
+    if workers == 1:
+        _init_worker(copy.deepcopy(net), limits)
+        results = [_site_capacity(bus) for bus in buses]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(net, limits)) as pool:
+            results = list(pool.map(_site_capacity, buses, chunksize=max(len(buses) // 64, 1)))
+    return pd.DataFrame(results, index=buses, columns=["hosting_mw", "limited_by"])
+
+
+def study_sites(net, substations, workers=None, **limits):
+    """Runs the hosting capacity and short-circuit study for all substations.
+
+    Returns one table with every substation, ranked by hosting capacity, then
+    short-circuit power. Sites at a slack bus absorb any injection and only see
+    the assumed EXT_GRID_SC_MVA, so they are not searched: they have limited_by
+    "slack", no capacity or short-circuit power and come after the ranked
+    sites, followed by the substations without a bus ("no bus").
+    """
+    sites = site_buses(net, substations)
+    slack = sites.isin(net.ext_grid.bus[net.ext_grid.in_service]).values
+    capacity = hosting_capacity(net, sites.values[~slack], workers=workers, **limits)
+    sk_mva = short_circuit_power(net).reindex(sites.values).where(~slack)
+
+    table = pd.DataFrame({
+        "substation": sites.index,
+        "name": substations["name"].reindex(sites.index).values,
+        "bus": sites.values,
+        "vn_kv": net.bus.vn_kv.loc[sites.values].values,
+        "hosting_mw": capacity.hosting_mw.reindex(sites.values).values,
+        "limited_by": capacity.limited_by.reindex(sites.values).where(~slack, "slack").values,
+        "sk_mva": sk_mva.values,
+    })
+    no_bus = substations.index.difference(sites.index)
+    table = pd.concat([table, pd.DataFrame({
+        "substation": no_bus,
+        "name": substations["name"].reindex(no_bus).values,
+        "limited_by": "no bus",
+    })], ignore_index=True)
+    table["bus"] = table.bus.astype("Int64")
+    table["scr"] = table.sk_mva / table.hosting_mw.where(table.hosting_mw > 0)
+    table = table.sort_values(["hosting_mw", "sk_mva"], ascending=False).reset_index(drop=True)
+    table.index.name = "rank"
+    table.index += 1
+    return table
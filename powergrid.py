@@ -0,0 +1,291 @@
+"""Pipeline steps shared by the scripts and the benchmark suite."""
+import json
+
+import folium
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pandapower as pp
+import shapely
+from folium.plugins import FastMarkerCluster
+from shapely.geometry import Point, Polygon, MultiPolygon
+from shapely.ops import nearest_points
+
+
+def has_open_space(substation_geometry, buildings_gdf, radius=1000):
+    buffer = substation_geometry.buffer(radius)
+    total_area = buffer.area
+    buildings_in_buffer = buildings_gdf[buildings_gdf.intersects(buffer)]
+    if len(buildings_in_buffer) == 0:
+        return True
+    buildings_area = buildings_in_buffer.geometry.buffer(25).unary_union.intersection(buffer).area
+    return (buildings_area / total_area) < 0.5
+
+
+def filter_substations(substations, buildings, national_parks):
+    """Keeps substations away from buildings and outside national parks (all in EPSG:3857)."""
+    return substations[
+        substations.geometry.apply(lambda x:
+            (buildings.distance(x).min() >= 25 or has_open_space(x, buildings))
+            and
+            not national_parks.geometry.intersects(x).any()
+        )
+    ]
+
+
+def parse_voltage(voltage_str):
+    """Returns the highest voltage in an OSM voltage tag such as "380000;220000"."""
+    voltages = [int(v) for v in str(voltage_str).split(';') if v.strip().isdigit()]
+    return max(voltages) if voltages else 0
+
+
+def find_lubmin_buses(substations):
+    lubmin_buses = substations[substations["name"].str.contains("Lubmin", na=False, case=False)]
+
+    if lubmin_buses.empty:
+        lubmin_buses = substations[
+            substations.geometry.x.between(13.5, 13.8) & substations.geometry.y.between(54.0, 54.3)
+        ]
+    return lubmin_buses
+
+
+def snap_lines(power_lines, bus_geometries, bus_ids):
+    """Yields (row, from_bus, to_bus) for every LineString, snapping both ends to the nearest bus."""
+    # Convert bus geometries to a list for nearest neighbor lookup
+    bus_mapping = {geometry: bus_id for geometry, bus_id in zip(bus_geometries, bus_ids)}
+    bus_points = list(bus_mapping.keys())
+
+    def find_nearest_bus(point):
+        """Finds the nearest bus ID for a given point."""
+        nearest = nearest_points(point, gpd.GeoSeries(bus_points).unary_union)[1]
+        return bus_mapping.get(nearest, None)
+
+    for _, row in power_lines.iterrows():
+        if row.geometry.geom_type == "LineString":
+            coords = list(row.geometry.coords)
+            yield row, find_nearest_bus(Point(coords[0])), find_nearest_bus(Point(coords[-1]))
+
+
+def build_network(substations, power_lines):
+    """Builds the Lubmin network from WGS84 data.
+
+    Returns the net, the Lubmin bus IDs and the (from_bus, to_bus) pairs of the added lines.
+    """
+    # Create an empty Pandapower network
+    print("🔹 Creating an empty Pandapower network...")
+    net = pp.create_empty_network()
+
+    # Find buses located in Lubmin
+    lubmin_buses = find_lubmin_buses(substations)
+    print(f"Found {len(lubmin_buses)} buses in Lubmin.")
+
+    # Map Lubmin buses to their IDs in Pandapower
+    lubmin_bus_ids = []
+    for _, row in lubmin_buses.iterrows():
+        bus_id = pp.create_bus(net, vn_kv=380, name=row.get("name", "Lubmin Substation"))
+        lubmin_bus_ids.append(bus_id)
+
+        # Add external grid (slack bus) to the first Lubmin bus
+        if len(lubmin_bus_ids) == 1:
+            pp.create_ext_grid(net, bus=bus_id, vm_pu=1.0, va_degree=0.0)
+            print(f"Added external grid connection to bus {bus_id}")
+
+    print(f"Lubmin bus IDs: {lubmin_bus_ids}")
+
+    # Filter power lines where at least one end is a Lubmin bus
+    lubmin_lines = []
+    for row, from_bus, to_bus in snap_lines(power_lines, lubmin_buses.geometry, lubmin_bus_ids):
+        if from_bus in lubmin_bus_ids or to_bus in lubmin_bus_ids:
+            pp.create_line(
+                net, from_bus=from_bus, to_bus=to_bus,
+                length_km=row.geometry.length / 1000, std_type="NAYY 4x50 SE"
+            )
+            lubmin_lines.append((from_bus, to_bus))
+
+    print(f"Added {len(lubmin_lines)} lines passing through Lubmin.")
+
+    # Ensure at least one load and one generator exist
+    if len(lubmin_bus_ids) > 1:
+        print(f"Adding loads and generators to {len(lubmin_bus_ids)} Lubmin buses...")
+        for bus in lubmin_bus_ids:
+            pp.create_load(net, bus=bus, p_mw=5, q_mvar=2)
+            pp.create_sgen(net, bus=bus, p_mw=10, q_mvar=3)
+
+        print(f"{len(net.load)} loads and {len(net.sgen)} generators added.")
+
+    # Check if any buses are isolated
+    for bus in net.bus.index:
+        connected = net.line[(net.line.from_bus == bus) | (net.line.to_bus == bus)]
+        if connected.empty:
+            print(f"Warning: Bus {bus} is not connected to any line.")
+
+    return net, lubmin_bus_ids, lubmin_lines
+
+
+def run_power_flow(net):
+    pp.runpp(net, enforce_q_lims=True, init="flat", calculate_voltage_angles=True)
+
+
+def loading_color(line_loading):
+    if line_loading < 50:
+        return "green"
+    elif 50 <= line_loading < 80:
+        return "orange"
+    return "red"
+
+
+def marker_location(geometry):
+    """Returns [lat, lon] of a point, or of the centroid of a polygon."""
+    if isinstance(geometry, (Polygon, MultiPolygon)):
+        centroid = geometry.centroid
+        return [centroid.y, centroid.x]
+    return [geometry.y, geometry.x]
+
+
+def add_power_lines(m, power_lines, power_flow):
+    """Adds power lines color-coded by power flow loading, with a loading label at the midpoint.
+
+    Returns the number of lines drawn.
+    """
+    drawn = 0
+    for idx, row in power_lines.iterrows():
+        if row.geometry and row.geometry.geom_type == "LineString":
+            # Use highest voltage if multiple exist
+            voltage = parse_voltage(row.get('voltage', '0'))
+
+            # Get power flow loading % (if available)
+            try:
+                line_loading = power_flow.iloc[idx]["loading_percent"]
+            except IndexError:
+                line_loading = 0  # Default if no power flow data
+
+            color = loading_color(line_loading)
+
+            # Create a popup message showing voltage & power flow
+            popup_text = f"Voltage: {voltage/1000} kV<br>Power Flow: {line_loading:.2f}%"
+
+            folium.PolyLine(
+                locations=[[lat, lon] for lon, lat in row.geometry.coords],
+                color=color,
+                weight=2.5,
+                popup=folium.Popup(popup_text, max_width=300)
+            ).add_to(m)
+
+            mid_index = len(row.geometry.coords) // 2
+            mid_point = row.geometry.coords[mid_index]
+
+            folium.Marker(
+                location=[mid_point[1], mid_point[0]],  # (lat, lon)
+                icon=folium.DivIcon(
+                    html=f'<div style="font-size: 10pt; color: {color}; font-weight: bold;">{line_loading:.2f}%</div>'
+                )
+            ).add_to(m)
+            drawn += 1
+    return drawn
+
+
+def add_station_markers(m, stations, label, color, radius):
+    """Adds one circle marker per substation or transformer. Returns the number of markers."""
+    added = 0
+    for _, row in stations.iterrows():
+        try:
+            if row.geometry.is_empty:
+                continue
+
+            folium.CircleMarker(
+                location=marker_location(row.geometry),
+                radius=radius,
+                color=color,
+                fill=True,
+                popup=f"{label}: {row.get('name', 'Unknown')}<br>Voltage: {row.get('voltage', 'Unknown')}V"
+            ).add_to(m)
+            added += 1
+        except Exception as e:
+            print(f"Error adding {label.lower()}: {e}")
+    return added
+
+
+# Above this many substations and transformers the map switches to clustered point layers
+CLUSTER_THRESHOLD = 5000
+
+# Builds a circle marker from a compact [lat, lon, value, ...] row; the popup is only
+# assembled when it is opened.
+CLUSTER_CALLBACK = """
+(function (row) {
+    var columns = %(columns)s;
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {radius: %(radius)d, color: %(color)s, fill: true});
+    marker.bindPopup(function () {
+        var html = "<b>" + %(label)s + "</b>";
+        for (var i = 0; i < columns.length; i++) {
+            var value = row[i + 2];
+            if (value !== null && value !== "") {
+                html += "<br>" + columns[i] + ": " + String(value).replace(/&/g, "&amp;").replace(/</g, "&lt;");
+            }
+        }
+        return html;
+    }, {maxWidth: 300});
+    return marker;
+})
+"""
+
+
+def add_clustered_station_markers(m, stations, label, color, radius, columns=("name", "voltage")):
+    """Adds substations or transformers as one clustered layer built in the browser.
+
+    Points are shipped as compact [lat, lon, value, ...] arrays with the column
+    names stored once; columns without any value are dropped. Returns the number of points.
+    """
+    stations = stations[stations.geometry.notna() & ~stations.geometry.is_empty]
+    columns = [c for c in columns if c in stations.columns and stations[c].notna().any()]
+
+    centroids = shapely.centroid(np.asarray(stations.geometry))
+    rows = pd.DataFrame({"lat": shapely.get_y(centroids).round(6), "lon": shapely.get_x(centroids).round(6)},
+                        index=stations.index)
+    rows = pd.concat([rows, stations[columns]], axis=1)
+    # to_json maps NaN to null and converts numpy and timestamp values
+    data = json.loads(rows.to_json(orient="values", date_format="iso"))
+
+    callback = CLUSTER_CALLBACK % {
+        "columns": json.dumps(columns),
+        "radius": radius,
+        "color": json.dumps(color),
+        "label": json.dumps(label),
+    }
+    FastMarkerCluster(data, callback=callback, name=label).add_to(m)
+    return len(data)
+
+
+LEGEND_HTML = '''
+<div style="position: fixed;
+            bottom: 50px; right: 50px; width: 200px; height: 180px;
+            border:2px solid grey; z-index:9999; background-color:white;
+            opacity:0.8;
+            padding: 10px;
+            font-size: 14px;
+            ">
+            <p><b>Legend</b></p>
+            <p><span style="color:green;">■</span> Low Load (<50%)</p>
+            <p><span style="color:orange;">■</span> Medium Load (50-80%)</p>
+            <p><span style="color:red;">■</span> High Load (>80%)</p>
+            <p><span style="color:blue;">●</span> Substations</p>
+            <p><span style="color:orange;">●</span> Transformers</p>
+</div>
+'''
+
+
+def render_power_flow_map(power_lines, substations, transformers, power_flow, cluster=None):
+    """Builds the power flow map from WGS84 data, centered on Lubmin.
+
+    cluster=None clusters substations and transformers only above CLUSTER_THRESHOLD points.
+    Returns the map and the number of lines and points drawn.
+    """
+    if cluster is None:
+        cluster = len(substations) + len(transformers) > CLUSTER_THRESHOLD
+    add_markers = add_clustered_station_markers if cluster else add_station_markers
+
+    m = folium.Map(location=[54.1453, 13.6422], zoom_start=12)
+    lines = add_power_lines(m, power_lines, power_flow)
+    points = add_markers(m, substations, "Substation", "blue", 8)
+    points += add_markers(m, transformers, "Transformer", "orange", 5)
+    m.get_root().html.add_child(folium.Element(LEGEND_HTML))
+    return m, lines, points
@@ -0,0 +1,152 @@
+"""Per-stage timing and memory instrumentation shared by the pipeline scripts.
+
+Every ``stage()`` block appends one JSON line to ``data/profile.jsonl`` with
+wall time, CPU time, memory and whatever counts the caller records.
+
+Memory: ``process_peak_rss_mb`` is the peak RSS of the whole process so far
+(a high-water mark, it never goes down) and ``peak_rss_growth_mb`` how much
+the stage raised it. The memory used by the stage itself is
+``tracemalloc_peak_mb``, recorded with PROFILE_TRACEMALLOC=1.
+
+Environment variables:
+    PROFILE_LOG          path of the JSON-lines file ("" disables logging)
+    PROFILE_STAGES       comma separated stage names to dump a profile for ("all" for every stage)
+    PROFILER             "cprofile" (default) or "pyinstrument"
+    PROFILE_TRACEMALLOC  set to 1 to also record the tracemalloc peak of each stage
+"""
+import cProfile
+import json
+import itertools
+import os
+import re
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+data_dir = os.path.join(os.path.dirname(__file__), 'data')
+
+PROFILE_LOG = os.environ.get("PROFILE_LOG", os.path.join(data_dir, "profile.jsonl"))
+PROFILE_STAGES = {s.strip() for s in os.environ.get("PROFILE_STAGES", "").split(",") if s.strip()}
+PROFILER = os.environ.get("PROFILER", "cprofile")
+PROFILE_TRACEMALLOC = os.environ.get("PROFILE_TRACEMALLOC", "") == "1"
+PROFILE_DIR = os.path.join(data_dir, "profiles")
+
+SCRIPT = os.path.splitext(os.path.basename(sys.argv[0] or "interactive"))[0]
+
+# Numbers the profile dumps of this process, so repeated stages don't overwrite each other
+_dump_counter = itertools.count(1)
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MB (None if unknown)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+        return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+
+
+def write_record(record, path=None):
+    path = PROFILE_LOG if path is None else path
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+def _start_profiler():
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed, falling back to cProfile")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(text)).strip("-").lower()
+
+
+def _dump_profiler(profiler, name, started, description=None):
+    """Writes the profile to data/profiles/<script>_<start time>_<n>_<stage>[_<description>]."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    parts = [SCRIPT, started.strftime("%Y%m%d-%H%M%S"), f"{next(_dump_counter):02d}", _slug(name)]
+    if description:
+        parts.append(_slug(description))
+    base = os.path.join(PROFILE_DIR, "_".join(parts))
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats(base + ".prof")
+        return base + ".prof"
+    profiler.stop()
+    with open(base + ".html", "w", encoding="utf-8") as f:
+        f.write(profiler.output_html())
+    return base + ".html"
+
+
+@contextmanager
+def stage(name, **counts):
+    """Measures a pipeline stage and emits it as one JSON line.
+
+    Yields a dict the caller can fill with counts, e.g. ``rec["rows"] = len(gdf)``.
+    """
+    record = dict(counts)
+    dump = name in PROFILE_STAGES or "all" in PROFILE_STAGES
+    started_tracing = PROFILE_TRACEMALLOC and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif PROFILE_TRACEMALLOC:
+        tracemalloc.reset_peak()
+    profiler = _start_profiler() if dump else None
+
+    started = datetime.now()
+    rss_start = peak_rss_mb()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    status = "ok"
+    try:
+        yield record
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        result = {
+            "script": SCRIPT,
+            "stage": name,
+            "started": started.isoformat(timespec="seconds"),
+            "status": status,
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "process_peak_rss_mb": peak_rss_mb(),
+        }
+        if rss_start is not None and result["process_peak_rss_mb"] is not None:
+            result["peak_rss_growth_mb"] = round(result["process_peak_rss_mb"] - rss_start, 1)
+        if PROFILE_TRACEMALLOC:
+            result["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            if started_tracing:
+                tracemalloc.stop()
+        if profiler is not None:
+            result["profile"] = _dump_profiler(profiler, name, started, record.get("description"))
+        result.update(record)
+        write_record(result)
@@ -0,0 +1,118 @@
+import json
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+import shapely
+
+from geojson_stream import GeoJSONWriter, convert, iter_features, read_batches, read_crs, write_geojson
+
+
+def sample(n=25):
+    """Points and lines in EPSG:25833 with strings that look like JSON structure."""
+    return gpd.GeoDataFrame({
+        "name": [f'Umspannwerk "{i}" ]}},[' if i % 3 else None for i in range(n)],
+        "voltage": [str(110000 * (1 + i % 2)) for i in range(n)],
+        "length": [i * 1.5 for i in range(n)],
+    }, geometry=[
+        shapely.Point(400000 + i, 6000000 + i) if i % 2 else
+        shapely.LineString([(400000 + i, 6000000), (400100 + i, 6000050 + i), (400200, 6000100)])
+        for i in range(n)
+    ], crs="EPSG:25833")
+
+
+def read_all(path, **kwargs):
+    return pd.concat(list(read_batches(path, **kwargs)), ignore_index=True)
+
+
+def test_round_trip_with_small_chunks_and_batches(tmp_path):
+    gdf = sample()
+    path = str(tmp_path / "sample.geojson")
+    assert write_geojson(path, gdf, batch_size=4) == len(gdf)
+
+    batches = list(read_batches(path, batch_size=7, chunk_size=64))
+    assert [len(b) for b in batches] == [7, 7, 7, 4]
+    result = pd.concat(batches, ignore_index=True)
+    assert result.crs == gdf.crs
+    assert list(result["name"]) == list(gdf["name"])
+    assert list(result["voltage"]) == list(gdf["voltage"])
+    assert result.geometry.geom_equals(gdf.geometry).all()
+    # Same features as a plain json.load of the file
+    with open(path, encoding="utf-8") as f:
+        assert [feature for _, feature in iter_features(path, chunk_size=16)] == json.load(f)["features"]
+    # GDAL reads the file too
+    assert len(gpd.read_file(path)) == len(gdf)
+
+
+def test_named_multiindex_is_written_as_columns(tmp_path):
+    gdf = sample(6)
+    gdf["element"] = ["node", "way"] * 3
+    gdf["id"] = range(100, 106)
+    indexed = gdf.set_index(["element", "id"])
+
+    path = str(tmp_path / "osm.geojson")
+    write_geojson(path, indexed)
+    result = read_all(path)
+    assert list(result["element"]) == list(gdf["element"])
+    assert list(result["id"]) == list(gdf["id"])
+
+    write_geojson(path, indexed, index=False)
+    assert "element" not in read_all(path)
+
+
+def test_default_integer_index_is_not_written(tmp_path):
+    path = str(tmp_path / "plain.geojson")
+    write_geojson(path, sample(3))
+    assert sorted(read_all(path).columns) == ["geometry", "length", "name", "voltage"]
+
+
+def test_crs_is_kept_and_reprojected(tmp_path):
+    gdf = sample()
+    path = str(tmp_path / "sample.geojson")
+    write_geojson(path, gdf)
+    assert read_crs(path) == "urn:ogc:def:crs:EPSG::25833"
+
+    wgs84 = read_all(path, to_crs="EPSG:4326", batch_size=5)
+    assert wgs84.crs == "EPSG:4326"
+    expected = gdf.to_crs("EPSG:4326").geometry
+    assert shapely.equals_exact(wgs84.geometry.values, expected.values, tolerance=1e-9).all()
+
+    # Writing with another CRS reprojects every batch
+    out = str(tmp_path / "wgs84.geojson")
+    write_geojson(out, gdf, crs="EPSG:4326", batch_size=3)
+    assert read_crs(out) == "urn:ogc:def:crs:OGC:1.3:CRS84"
+    assert shapely.equals_exact(read_all(out).geometry.values, expected.values, tolerance=1e-9).all()
+
+
+def test_empty_collection_keeps_source_crs(tmp_path):
+    src, dst = str(tmp_path / "empty.geojson"), str(tmp_path / "copy.geojson")
+    assert write_geojson(src, sample().iloc[:0]) == 0
+    assert list(iter_features(src)) == []
+
+    assert convert(src, dst) == 0
+    assert read_crs(dst) == "urn:ogc:def:crs:EPSG::25833"
+    assert convert(src, dst, to_crs="EPSG:4326") == 0
+    assert read_crs(dst) == "urn:ogc:def:crs:OGC:1.3:CRS84"
+
+
+def test_convert_in_place(tmp_path):
+    path = str(tmp_path / "sample.geojson")
+    write_geojson(path, sample())
+    assert convert(path, path, to_crs="EPSG:4326", batch_size=4) == 25
+    assert len(read_all(path)) == 25
+    assert not (tmp_path / "sample.geojson.tmp").exists()
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = str(tmp_path / "sample.geojson")
+    write_geojson(path, sample())
+    with open(path, encoding="utf-8") as f:
+        before = f.read()
+
+    with pytest.raises(RuntimeError):
+        with GeoJSONWriter(path, crs="EPSG:25833") as writer:
+            writer.write(sample(3))
+            raise RuntimeError("interrupted")
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == before
+    assert not (tmp_path / "sample.geojson.tmp").exists()
@@ -0,0 +1,64 @@
+import copy
+import math
+
+import pandas as pd
+import pandapower as pp
+import pytest
+
+from hosting_capacity import MAX_LOADING_PERCENT, VM_MAX_PU, VM_MIN_PU, study_sites
+from test_voltage_levels import multilevel_net
+
+TOLERANCE_MW = 0.5
+
+
+def violated_limits(net, bus, p_mw):
+    """Runs the power flow with p_mw fed in at bus and returns the violated limits."""
+    net = copy.deepcopy(net)
+    pp.create_sgen(net, bus=bus, p_mw=p_mw, q_mvar=0)
+    pp.runpp(net, init="flat", calculate_voltage_angles=True)
+    violated = set()
+    if (net.res_line.loading_percent > MAX_LOADING_PERCENT).any():
+        violated.add("line loading")
+    if (net.res_trafo.loading_percent > MAX_LOADING_PERCENT).any():
+        violated.add("trafo loading")
+    vm = net.res_bus.vm_pu.dropna()
+    if ((vm > VM_MAX_PU) | (vm < VM_MIN_PU)).any():
+        violated.add("voltage")
+    return violated
+
+
+@pytest.fixture(scope="module")
+def sites():
+    net, dead = multilevel_net()
+    ehv, hv, mv = (net.bus.index[net.bus.vn_kv == kv] for kv in (380, 110, 20))
+    net.bus["substation"] = None
+    for substation, bus in {"slack": ehv[0], "hv": hv[1], "mv": mv[1], "dead": dead[1]}.items():
+        net.bus.at[bus, "substation"] = substation
+    substations = pd.DataFrame({"name": ["Slack", "HV", "MV", "Dead", "Planned"]},
+                               index=["slack", "hv", "mv", "dead", "planned"])
+    table = study_sites(net, substations, workers=1, max_mw=200, tolerance_mw=TOLERANCE_MW)
+    return net, table.set_index("substation")
+
+
+def test_every_substation_is_listed(sites):
+    net, table = sites
+    assert sorted(table.index) == ["dead", "hv", "mv", "planned", "slack"]
+    assert table.limited_by["slack"] == "slack"
+    assert math.isnan(table.hosting_mw["slack"]) and math.isnan(table.sk_mva["slack"])
+    assert table.limited_by["planned"] == "no bus"
+    assert pd.isna(table.bus["planned"])
+    assert table.limited_by["dead"] == "not supplied"
+    assert table.hosting_mw["dead"] == 0
+    # Searched sites first, then the dead island, the slack and the substation without a bus
+    assert list(table.index[2:]) == ["dead", "slack", "planned"]
+
+
+@pytest.mark.parametrize("substation", ["hv", "mv"])
+def test_hosting_capacity_matches_power_flow(sites, substation):
+    net, table = sites
+    site = table.loc[substation]
+    assert site.sk_mva > 0
+    assert 0 < site.hosting_mw < 200
+
+    assert violated_limits(net, site.bus, site.hosting_mw) == set()
+    assert site.limited_by in violated_limits(net, site.bus, site.hosting_mw + TOLERANCE_MW)
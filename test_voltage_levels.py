@@ -0,0 +1,66 @@
+import copy
+
+import pandapower as pp
+import pytest
+
+from voltage_levels import solve_levels
+
+
+def multilevel_net():
+    """380/110/20 kV chain with load and generation at every level, plus a 110 kV island without a slack."""
+    net = pp.create_empty_network()
+    ehv = pp.create_buses(net, 2, vn_kv=380)
+    hv = pp.create_buses(net, 3, vn_kv=110)
+    mv = pp.create_buses(net, 2, vn_kv=20)
+    dead = pp.create_buses(net, 2, vn_kv=110)
+
+    pp.create_ext_grid(net, bus=ehv[0], vm_pu=1.0, va_degree=0.0)
+    pp.create_line(net, ehv[0], ehv[1], length_km=40, std_type="490-AL1/64-ST1A 380.0")
+    pp.create_transformer_from_parameters(net, ehv[1], hv[0], sn_mva=400, vn_hv_kv=380, vn_lv_kv=110,
+                                          vk_percent=12, vkr_percent=0.25, pfe_kw=60, i0_percent=0.05)
+    pp.create_line(net, hv[0], hv[1], length_km=15, std_type="149-AL1/24-ST1A 110.0")
+    pp.create_line(net, hv[1], hv[2], length_km=10, std_type="149-AL1/24-ST1A 110.0")
+    pp.create_transformer_from_parameters(net, hv[2], mv[0], sn_mva=40, vn_hv_kv=110, vn_lv_kv=20,
+                                          vk_percent=12, vkr_percent=0.35, pfe_kw=25, i0_percent=0.05)
+    pp.create_line(net, mv[0], mv[1], length_km=3, std_type="NA2XS2Y 1x240 RM/25 12/20 kV")
+    pp.create_line(net, dead[0], dead[1], length_km=5, std_type="149-AL1/24-ST1A 110.0")
+
+    for bus in (ehv[1], hv[1], hv[2], mv[1], dead[1]):
+        pp.create_load(net, bus=bus, p_mw=5, q_mvar=2)
+        pp.create_sgen(net, bus=bus, p_mw=2, q_mvar=0)
+    return net, list(dead)
+
+
+def solve_full(net):
+    full = copy.deepcopy(net)
+    pp.runpp(full, init="flat", calculate_voltage_angles=True)
+    return full
+
+
+@pytest.mark.parametrize("reduction", ["ward", "xward", "rei"])
+def test_equivalents_match_full_power_flow(reduction):
+    net, dead = multilevel_net()
+    full = solve_full(net)
+
+    res_bus, res_line = solve_levels(net, reduction, workers=1)
+
+    supplied = full.res_bus.index.difference(dead)
+    assert res_bus.vm_pu.reindex(dead).isna().all()
+    assert res_bus.vm_pu.loc[supplied].values == pytest.approx(full.res_bus.vm_pu.loc[supplied].values, abs=5e-3)
+    lines = full.line.index[~full.line.from_bus.isin(dead)]
+    assert res_line.loading_percent.loc[lines].values == pytest.approx(
+        full.res_line.loading_percent.loc[lines].values, rel=0.05, abs=0.5)
+
+
+def test_injections_solve_every_supplied_bus():
+    net, dead = multilevel_net()
+    full = solve_full(net)
+
+    res_bus, res_line = solve_levels(net, "injections", workers=1)
+
+    supplied = full.res_bus.index.difference(dead)
+    assert res_bus.vm_pu.reindex(dead).isna().all()
+    assert res_bus.vm_pu.loc[supplied].notna().all()
+    # The top level sees the levels below as loads, so it matches the full power flow
+    top = net.bus.index[net.bus.vn_kv == 380]
+    assert res_bus.vm_pu.loc[top].values == pytest.approx(full.res_bus.vm_pu.loc[top].values, abs=5e-3)
@@ -0,0 +1,320 @@
+"""Voltage-level decomposition of the OSM grid.
+
+build_multilevel_network() creates one bus level per voltage found in the line
+tags ("380000;220000" puts a circuit on both levels), couples the levels with
+transformers and gives every island a slack at its highest level. The levels
+can then be solved independently and in parallel:
+
+- "injections": bottom-up. Each level is solved with its upward transformers
+  as slack, and the power they draw becomes a load on the level above.
+- "ward", "xward", "rei": the base case is solved once, then for every level
+  the other levels are reduced to Ward/REI equivalents at the boundary buses
+  of the level (pandapower.grid_equivalents).
+
+Islands without a slack are left unsolved in all modes.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pandapower as pp
+import pandapower.topology as top
+import shapely
+from pandapower.grid_equivalents import get_equivalent
+from pandapower.toolbox import select_subnet
+
+from defaults import REDUCTIONS
+
+METRIC_CRS = "EPSG:25833"  # ETRS89 / UTM zone 33N
+SNAP_DISTANCE = 500  # m, line ends and transformers further away from a substation get their own bus
+JUNCTION_GRID = 50  # m, line ends in the same grid cell are merged into one junction bus
+
+# (minimum kV, pandapower line std type)
+LINE_TYPES = [
+    (300, "490-AL1/64-ST1A 380.0"),
+    (200, "490-AL1/64-ST1A 220.0"),
+    (60, "149-AL1/24-ST1A 110.0"),
+    (15, "NA2XS2Y 1x240 RM/25 12/20 kV"),
+    (1, "NA2XS2Y 1x185 RM/25 6/10 kV"),
+    (0, "NAYY 4x150 SE"),
+]
+
+# (minimum high-voltage kV, transformer parameters)
+TRAFO_PARAMETERS = [
+    (300, dict(sn_mva=400, vk_percent=12, vkr_percent=0.25, pfe_kw=60, i0_percent=0.05)),
+    (200, dict(sn_mva=200, vk_percent=12, vkr_percent=0.3, pfe_kw=50, i0_percent=0.05)),
+    (60, dict(sn_mva=40, vk_percent=12, vkr_percent=0.35, pfe_kw=25, i0_percent=0.05)),
+    (0, dict(sn_mva=0.63, vk_percent=6, vkr_percent=1.2, pfe_kw=1.4, i0_percent=0.3)),
+]
+
+# Same demand and generation per substation as the Lubmin network in powergrid.build_network()
+LOAD_MW, LOAD_MVAR = 5, 2
+SGEN_MW, SGEN_MVAR = 10, 3
+
+
+def parse_levels(voltage_str):
+    """Returns all voltage levels of an OSM voltage tag in kV, highest first."""
+    levels = {int(v) / 1000 for v in str(voltage_str).split(';') if v.strip().isdigit() and int(v) > 0}
+    return sorted(levels, reverse=True)
+
+
+def line_type(vn_kv):
+    return next(std_type for min_kv, std_type in LINE_TYPES if vn_kv >= min_kv)
+
+
+def trafo_parameters(hv_kv):
+    return next(params for min_kv, params in TRAFO_PARAMETERS if hv_kv >= min_kv)
+
+
+def _transformer_levels(row):
+    tags = [row.get("voltage:primary"), row.get("voltage:secondary")]
+    levels = sorted({kv for tag in tags for kv in parse_levels(tag)}, reverse=True)
+    return levels if len(levels) >= 2 else parse_levels(row.get("voltage"))
+
+
+def _nearest(tree_points, points, max_distance=SNAP_DISTANCE):
+    """Returns for each point the index of the nearest tree point within max_distance, or -1."""
+    nearest = np.full(len(points), -1)
+    if len(tree_points) and len(points):
+        pairs = shapely.STRtree(tree_points).query_nearest(points, max_distance=max_distance, all_matches=False)
+        nearest[pairs[0]] = pairs[1]
+    return nearest
+
+
+def build_multilevel_network(substations, power_lines, transformers):
+    """Builds one network with a bus level per voltage, coupled by transformers.
+
+    Transformers come from the OSM transformer features and, where those are
+    missing, from substations tagged with several voltages. net.bus["substation"]
+    holds the index of the substation a bus belongs to (None for junctions).
+    """
+    substations = substations.to_crs(METRIC_CRS)
+    power_lines = power_lines[power_lines.geom_type == "LineString"].to_crs(METRIC_CRS)
+    transformers = transformers.to_crs(METRIC_CRS)
+
+    net = pp.create_empty_network()
+    net.bus["substation"] = None
+
+    line_levels = [parse_levels(tag) for tag in power_lines["voltage"]]
+    levels = sorted({kv for lv in line_levels for kv in lv}, reverse=True)
+
+    station_points = shapely.centroid(np.asarray(substations.geometry))
+    station_levels = [[kv for kv in parse_levels(tag) if kv in levels] for tag in substations["voltage"]]
+
+    level_buses = {}  # kv -> (bus ids, bus points) for snapping transformers
+    station_bus = {}  # (substation position, kv) -> bus
+    for kv in levels:
+        lines = power_lines[[kv in lv for lv in line_levels]]
+        geoms = np.asarray(lines.geometry)
+        stations = np.array([i for i, lv in enumerate(station_levels) if kv in lv], dtype=int)
+
+        # Snap line ends to substations of this level, or merge them into junctions
+        ends = np.concatenate([shapely.get_point(geoms, 0), shapely.get_point(geoms, -1)])
+        nearest = _nearest(station_points[stations], ends)
+        keys = [("s", stations[n]) if n >= 0 else
+                ("j", round(shapely.get_x(p) / JUNCTION_GRID), round(shapely.get_y(p) / JUNCTION_GRID))
+                for p, n in zip(ends, nearest)]
+
+        nodes = {("s", s): station_points[s] for s in stations}
+        for key, point in zip(keys, ends):
+            nodes.setdefault(key, point)
+        names = [substations["name"].iloc[key[1]] if key[0] == "s" else None for key in nodes]
+        bus_ids = pp.create_buses(net, len(nodes), vn_kv=kv, name=names)
+        key_bus = dict(zip(nodes, bus_ids))
+        for key, bus in key_bus.items():
+            if key[0] == "s":
+                net.bus.at[bus, "substation"] = substations.index[key[1]]
+                station_bus[(key[1], kv)] = bus
+        level_buses[kv] = (np.asarray(bus_ids), np.array(list(nodes.values())))
+
+        from_buses = np.array([key_bus[k] for k in keys[:len(geoms)]], dtype=int)
+        to_buses = np.array([key_bus[k] for k in keys[len(geoms):]], dtype=int)
+        connected = from_buses != to_buses
+        if connected.any():
+            pp.create_lines(
+                net, from_buses[connected], to_buses[connected],
+                length_km=np.maximum(shapely.length(geoms[connected]) / 1000, 0.001),
+                std_type=line_type(kv), name=lines["name"].values[connected] if "name" in lines else None
+            )
+
+    # Couple the levels with transformers
+    coupled = set()
+
+    def add_trafo(hv_bus, lv_bus, name):
+        if (hv_bus, lv_bus) in coupled or hv_bus == lv_bus:
+            return
+        coupled.add((hv_bus, lv_bus))
+        pp.create_transformer_from_parameters(
+            net, hv_bus, lv_bus, vn_hv_kv=net.bus.vn_kv.at[hv_bus], vn_lv_kv=net.bus.vn_kv.at[lv_bus],
+            name=name, **trafo_parameters(net.bus.vn_kv.at[hv_bus])
+        )
+
+    for row, point in zip(transformers.to_dict("records"), shapely.centroid(np.asarray(transformers.geometry))):
+        trafo_levels = [kv for kv in _transformer_levels(row) if kv in level_buses]
+        if len(trafo_levels) < 2:
+            continue
+        hv, lv = trafo_levels[0], trafo_levels[1]
+        hv_idx = _nearest(level_buses[hv][1], [point])[0]
+        lv_idx = _nearest(level_buses[lv][1], [point])[0]
+        if hv_idx >= 0 and lv_idx >= 0:
+            add_trafo(level_buses[hv][0][hv_idx], level_buses[lv][0][lv_idx], row.get("name"))
+
+    for s, lv in enumerate(station_levels):
+        for hv, lower in zip(lv, lv[1:]):
+            add_trafo(station_bus[(s, hv)], station_bus[(s, lower)], substations["name"].iloc[s])
+
+    # Demand and generation at the lowest level of every substation
+    for s, lv in enumerate(station_levels):
+        if lv:
+            bus = station_bus[(s, lv[-1])]
+            pp.create_load(net, bus=bus, p_mw=LOAD_MW, q_mvar=LOAD_MVAR)
+            pp.create_sgen(net, bus=bus, p_mw=SGEN_MW, q_mvar=SGEN_MVAR)
+
+    # One slack per island, at its highest voltage level
+    for island in top.connected_components(top.create_nxgraph(net)):
+        if len(island) > 1:
+            slack = net.bus.loc[list(island)].vn_kv.idxmax()
+            pp.create_ext_grid(net, bus=slack, vm_pu=1.0, va_degree=0.0)
+
+    return net
+
+
+def level_buses(net, vn_kv):
+    return net.bus.index[net.bus.vn_kv == vn_kv]
+
+
+def energized_islands(net):
+    """Yields the bus lists of the islands of net that contain a slack."""
+    for island in top.connected_components(top.create_nxgraph(net)):
+        if net.ext_grid.bus.isin(list(island)).any():
+            yield sorted(island)
+
+
+def split_islands(net):
+    """Yields the islands of net that contain a slack, as separate nets."""
+    for island in energized_islands(net):
+        yield select_subnet(net, island)
+
+
+def _solve(net):
+    """Runs one power flow, in a worker process when parallel."""
+    try:
+        pp.runpp(net, init="flat", calculate_voltage_angles=True)
+    except pp.LoadflowNotConverged:
+        return None
+    return net.res_bus, net.res_line, net.res_ext_grid
+
+
+def _map(fn, items, workers):
+    items = list(items)
+    if workers == 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, items))
+
+
+def solve_with_injections(net, workers=None):
+    """Solves the levels bottom-up, the islands of each level in parallel.
+
+    Returns res_bus and res_line for the whole net.
+    """
+    res_bus, res_line = [], []
+    injections = {}  # upper bus -> (p_mw, q_mvar) drawn by the levels below
+
+    for kv in sorted(net.bus.vn_kv.unique()):
+        buses = level_buses(net, kv)
+        level = select_subnet(net, buses)
+
+        # Upward transformers act as slack; split their exchange evenly if they share a bus
+        coupling = {}  # ext_grid -> upper buses
+        for lv_bus, trafos in net.trafo[net.trafo.lv_bus.isin(buses)].groupby("lv_bus"):
+            ext_grid = pp.create_ext_grid(level, bus=lv_bus, vm_pu=1.0, va_degree=0.0, name="upper levels")
+            coupling[ext_grid] = list(trafos.hv_bus)
+
+        for bus, (p_mw, q_mvar) in injections.items():
+            if bus in level.bus.index:
+                pp.create_load(level, bus=bus, p_mw=p_mw, q_mvar=q_mvar, name="lower levels")
+
+        islands = list(split_islands(level))
+        for result in _map(_solve, islands, workers):
+            if result is None:
+                print(f"Warning: power flow did not converge for an island at {kv} kV.")
+                continue
+            bus_res, line_res, ext_grid_res = result
+            res_bus.append(bus_res)
+            res_line.append(line_res)
+            for ext_grid, row in ext_grid_res.iterrows():
+                for hv_bus in coupling.get(ext_grid, []):
+                    p_mw, q_mvar = injections.get(hv_bus, (0.0, 0.0))
+                    share = len(coupling[ext_grid])
+                    injections[hv_bus] = (p_mw + row.p_mw / share, q_mvar + row.q_mvar / share)
+
+    return pd.concat(res_bus) if res_bus else net.res_bus, pd.concat(res_line) if res_line else net.res_line
+
+
+def reduce_level(net, vn_kv, eq_type="ward"):
+    """Returns the level with all other levels reduced to equivalents, solved.
+
+    net must hold the base case results (see solve_with_equivalents). Only the
+    islands touching the level are passed on; the boundary buses are the far
+    sides of the transformers touching the level.
+    """
+    buses = set(level_buses(net, vn_kv))
+    island_buses = [bus for island in energized_islands(net) if buses.intersection(island) for bus in island]
+    subnet = select_subnet(net, island_buses, include_results=True)
+    buses &= set(subnet.bus.index)
+
+    touching = subnet.trafo[subnet.trafo.hv_bus.isin(buses) != subnet.trafo.lv_bus.isin(buses)]
+    boundary = (set(touching.hv_bus) | set(touching.lv_bus)) - buses
+    if not boundary:
+        # The level is on its own, the base case results hold
+        return subnet
+    # get_equivalent runs the power flow of the reduced net
+    return get_equivalent(subnet, eq_type, boundary_buses=sorted(boundary), internal_buses=sorted(buses))
+
+
+def _reduce_and_solve(args):
+    net, vn_kv, eq_type = args
+    try:
+        eq_net = reduce_level(net, vn_kv, eq_type)
+    except pp.LoadflowNotConverged:
+        return None
+    buses = level_buses(net, vn_kv)
+    lines = net.line.index[net.line.from_bus.isin(buses)]
+    return (eq_net.res_bus.loc[eq_net.res_bus.index.intersection(buses)],
+            eq_net.res_line.loc[eq_net.res_line.index.intersection(lines)])
+
+
+def solve_with_equivalents(net, eq_type="ward", workers=None):
+    """Solves every level on its own reduced net, all levels in parallel.
+
+    The base case of the energized islands is solved once up front, the
+    reductions start from its results. Returns res_bus and res_line for the
+    whole net.
+    """
+    base = select_subnet(net, [bus for island in energized_islands(net) for bus in island])
+    if _solve(base) is None:
+        print("Warning: base case power flow did not converge.")
+        return net.res_bus, net.res_line
+
+    levels = sorted(base.bus.vn_kv.unique(), reverse=True)
+    results = _map(_reduce_and_solve, [(base, kv, eq_type) for kv in levels], workers)
+    res_bus, res_line = [], []
+    for kv, result in zip(levels, results):
+        if result is None:
+            print(f"Warning: power flow did not converge at {kv} kV.")
+            continue
+        res_bus.append(result[0])
+        res_line.append(result[1])
+    return pd.concat(res_bus) if res_bus else net.res_bus, pd.concat(res_line) if res_line else net.res_line
+
+
+def solve_levels(net, reduction="injections", workers=None):
+    """Solves net level by level with the given reduction, see the module docstring."""
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"Unknown reduction {reduction!r}, expected one of {', '.join(REDUCTIONS)}")
+    workers = workers or os.cpu_count()
+    if reduction == "injections":
+        return solve_with_injections(net, workers)
+    return solve_with_equivalents(net, reduction, workers)